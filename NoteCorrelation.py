@@ -3,6 +3,7 @@ from typing import Any, Callable, Iterator
 
 import numpy as np
 from tis.TIS import TIS, Float
+from tis.Metrics import Metric, TISBatch, cluster_counts
 from tis.NoteCluster import NoteCluster, sum_clusters
 
 logger = logging.getLogger(__name__)
@@ -34,8 +35,97 @@ def correlation(clusters:list[NoteCluster],
             results[offset][start + offset] = distance
     return results
 
-def draw_hitmap(data: np.ndarray[Any, np.dtype[Float]]) -> None:
+def window_counts(clusters:list[NoteCluster], windowSize:int) -> np.ndarray[Any, Any]:
+    # Note durations of the same windows as cluster_windows()
+    counts = np.cumsum(cluster_counts(clusters), axis=0)
+    counts = np.concatenate([np.zeros((1, counts.shape[1])), counts])
+    windows = max(len(clusters) - windowSize, 0)
+    return counts[windowSize:windowSize + windows] - counts[:windows]
+
+def pool_edges(length:int, size:int) -> np.ndarray[Any, Any]:
+    if size < 1:
+        raise ValueError(f'Pool size must be at least 1: {size}')
+    return np.linspace(0, length, min(length, size) + 1).astype(int)
+
+def pool_counts(counts:np.ndarray[Any, Any], size:int) -> np.ndarray[Any, Any]:
+    # Sums consecutive windows into at most size bins of (almost) equal length
+    edges = pool_edges(len(counts), size)
+    cumulative = np.concatenate([np.zeros((1, counts.shape[1])), np.cumsum(counts, axis=0)])
+    return cumulative[edges[1:]] - cumulative[edges[:-1]]
+
+Correlations = dict[str, np.ndarray[Any, np.dtype[Float]]]
+CellMasks = dict[str, np.ndarray[Any, np.dtype[np.bool_]]]
+
+def _cell_mask(batch:TISBatch, metric:Metric, size:int) -> np.ndarray[Any, np.dtype[np.bool_]]:
+    valid = metric.defined(batch)
+    mask = np.zeros((size, size), dtype=bool)
+    mask[:len(batch), :len(batch)] = np.triu(np.outer(valid, valid))
+    return mask
+
+def _batch_correlations(batch:TISBatch, metrics:list[Metric], size:int) -> tuple[Correlations, CellMasks]:
+    # The masks tell which cells hold a value, the others are padding or undefined windows
+    results = {}
+    masks = {}
+    for metric in metrics:
+        logger.info(f'Computing {metric} over {len(batch)} windows')
+        mask = _cell_mask(batch, metric, size)
+        data = np.zeros((size, size))
+        data[:len(batch), :len(batch)] = metric.kernel(batch)
+        results[metric.name] = np.where(mask, data, 0)
+        masks[metric.name] = mask
+    return results, masks
+
+def correlations(clusters:list[NoteCluster],
+                 metrics:list[Metric],
+                 windowSize:int) -> tuple[Correlations, CellMasks]:
+    # Same layout as correlation(), computed for all the metrics in a single pass
+    batch = TISBatch(window_counts(clusters, windowSize))
+    return _batch_correlations(batch, metrics, len(clusters))
+
+def previews(clusters:list[NoteCluster],
+             metrics:list[Metric],
+             windowSize:int,
+             size:int = 512) -> tuple[Correlations, CellMasks]:
+    # Approximated correlations: the windows are pooled into at most size bins,
+    # so the matrices are at most size x size whatever the length of the piece
+    counts = pool_counts(window_counts(clusters, windowSize), size)
+    return _batch_correlations(TISBatch(counts), metrics, len(counts))
+
+def preview_error(clusters:list[NoteCluster],
+                  metric:Metric,
+                  windowSize:int,
+                  size:int = 512) -> dict[str, float]:
+    # Compares the preview, expanded back to the windows, to the exact matrix on
+    # the cells that hold a value. max_observed is measured on this piece, not a bound.
+    counts = window_counts(clusters, windowSize)
+    windows = len(counts)
+    exact, masks = _batch_correlations(TISBatch(counts), [metric], windows)
+    preview, _ = _batch_correlations(TISBatch(pool_counts(counts, size)), [metric], min(windows, size))
+    bins = np.searchsorted(pool_edges(windows, size), np.arange(windows), side='right') - 1
+    mask = masks[metric.name]
+    errors = np.abs(exact[metric.name] - preview[metric.name][np.ix_(bins, bins)])[mask]
+    if len(errors) == 0:
+        return {}
+    return {
+        'max_observed': float(np.max(errors)),
+        'mean': float(np.mean(errors)),
+        'scale': float(np.max(np.abs(exact[metric.name][mask]))),
+    }
+
+def summarize(data: np.ndarray[Any, np.dtype[Float]], mask: np.ndarray[Any, np.dtype[np.bool_]]) -> dict[str, float]:
+    values = data[np.triu(mask, k=1)]
+    if len(values) == 0:
+        return {}
+    return {
+        'mean': float(np.mean(values)),
+        'std': float(np.std(values)),
+        'max': float(np.max(values)),
+    }
+
+def draw_hitmap(data: np.ndarray[Any, np.dtype[Float]], title:str | None = None) -> None:
     import matplotlib.pyplot as plt
+    if title is not None:
+        plt.title(title)
     plt.imshow(data, cmap='coolwarm', interpolation='nearest', origin='lower')
     plt.show()
             
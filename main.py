@@ -1,20 +1,38 @@
-from argparse import ArgumentParser, Namespace
+from argparse import ArgumentParser, ArgumentTypeError, Namespace
+from contextlib import nullcontext
 from enum import Enum
 import logging
 import shutil
 import sys, os
 
 import NoteCorrelation
-from mido import MidiFile
-from midi_parser import MidiParser
+import numpy as np
+from midi_parser import MidiParser, read_track_chunks, write_track_chunks
+from result_store import ResultStore
 from tis.NoteCluster import NoteCluster, sum_clusters
-from tis.TIS import TIS
+from tis.Metrics import METRICS
 
 logger = logging.getLogger(__name__)
 
 def eprint(message:str) -> None:
     print(message, file=sys.stderr)
 
+def metric_names(value:str) -> list[str]:
+    names = [name.strip() for name in value.split(',')]
+    for name in names:
+        if name not in METRICS:
+            raise ArgumentTypeError(f"invalid metric: '{name}' (choose from {', '.join(METRICS)})")
+    return names
+
+def positive_int(value:str) -> int:
+    try:
+        number = int(value)
+    except ValueError:
+        raise ArgumentTypeError(f"invalid int value: '{value}'")
+    if number < 1:
+        raise ArgumentTypeError(f"must be at least 1: '{value}'")
+    return number
+
 def argsparser() -> ArgumentParser:
     parser = ArgumentParser(
         description='This program generates an hierarcal tonality tree out of a generic MIDI file')
@@ -22,7 +40,13 @@ def argsparser() -> ArgumentParser:
     parser.add_argument('-r', '--recursive', action='store_true', help='Recursive search of MIDI files in directories')
     parser.add_argument('-w', '--window_size', type=int, default=1, help='Window Size (default: 1)')
     parser.add_argument('-c', '--combine_clusters', type=int, default=1, help='Combine Clusters (default: 1)')
+    parser.add_argument('-m', '--metric', type=metric_names, default=['radial'], help=f'Comma separated correlation metrics out of {",".join(METRICS)} (default: radial)')
+    parser.add_argument('-p', '--preview', action='store_true', help='Approximated correlation of at most PREVIEW_SIZE x PREVIEW_SIZE cells')
+    parser.add_argument('--preview_size', type=positive_int, default=512, help='Preview Size (default: 512)')
+    parser.add_argument('--preview_error', action='store_true', help='Report the observed error of the preview against the exact correlation')
     parser.add_argument('-o', dest='output', help='Output directory', default='output')
+    parser.add_argument('-d', '--dump_tracks', action='store_true', help='Dump every track of type 1 files to a separate MIDI file')
+    parser.add_argument('-s', '--store', help='Result store database (default: <output>/results.db)')
     return parser
 
 def get_midi_files(args:Namespace) -> list[tuple[str, str]]:
@@ -52,31 +76,33 @@ def get_midi_files(args:Namespace) -> list[tuple[str, str]]:
 def setup_output(output_dir:str, input_path:str) -> str:
     dir, _ = os.path.splitext(input_path)
     inner_output_dir = os.path.join(output_dir, dir)    
-    shutil.rmtree(inner_output_dir, ignore_errors=True)
     os.makedirs(inner_output_dir, exist_ok=True)
     logging.basicConfig(filename=os.path.join(inner_output_dir, "run.log"), level=logging.DEBUG, force=True)    
     return inner_output_dir
 
-def dump_midi(midi_file:MidiFile, directory:str) -> None:
+def dump_midi(parser:MidiParser, directory:str) -> None:
+    # Copies the raw track chunks, nothing is re-encoded through mido
     os.makedirs(directory, exist_ok=True)
-    midi_file.save(os.path.join(directory, f'all_tracks.mid'))
-    if midi_file.type != 1:
+    shutil.copyfile(parser.midi.filename, os.path.join(directory, f'all_tracks.mid'))
+    if parser.midi.type != 1:
         return
-    for i in range(1, len(midi_file.tracks)):
-        new_mid = MidiFile()
-        new_mid.tracks.append(midi_file.tracks[0])
-        new_mid.tracks.append(midi_file.tracks[i])
-        new_mid.save(os.path.join(directory, f'track{i}.mid'))
+    header, chunks = read_track_chunks(parser.midi.filename)
+    for i in range(1, len(chunks)):
+        write_track_chunks(os.path.join(directory, f'track{i}.mid'), header, [chunks[0], chunks[i]])
 
 def main(args:Namespace) -> None:
     midi_files = get_midi_files(args)
-    for file_parts in midi_files:
-        output_dir = setup_output(args.output, file_parts[1])
-        
-        midipath = os.path.join(*file_parts)
-        logger.info(os.path.abspath(midipath))
-        eprint(os.path.abspath(midipath))
-        handle_file(output_dir, midipath, args)
+    # Previews are a quick look, they are not written to the result store
+    with nullcontext() if args.preview else ResultStore(args.store or os.path.join(args.output, 'results.db')) as store:
+        if store is not None:
+            store.start_run(vars(args))
+        for file_parts in midi_files:
+            output_dir = setup_output(args.output, file_parts[1])
+            
+            midipath = os.path.join(*file_parts)
+            logger.info(os.path.abspath(midipath))
+            eprint(os.path.abspath(midipath))
+            handle_file(output_dir, midipath, args, store)
     print("Finished parsing and rendering")
 
 class ReturnValues(Enum):
@@ -94,7 +120,7 @@ def combine_clusters(clusters:list[NoteCluster], chunk_size:int) -> list[NoteClu
         pos += chunk_size
     return ret
 
-def handle_file(output_dir:str, midipath:str, args:Namespace) -> ReturnValues:        
+def handle_file(output_dir:str, midipath:str, args:Namespace, store:ResultStore | None = None) -> ReturnValues:        
         # Step 1: Parse the MIDI file
         try:
             parser = MidiParser(midipath)
@@ -102,20 +128,50 @@ def handle_file(output_dir:str, midipath:str, args:Namespace) -> ReturnValues:
         except Exception as ex:
             logger.critical(f"Failes parsing file {midipath}")
             logger.exception(ex)            
+            if store is not None:
+                store.append(os.path.abspath(midipath), ReturnValues.PARSE_FAILURE.name)
             return ReturnValues.PARSE_FAILURE
+        
+        if args.dump_tracks:
+            dump_midi(parser, os.path.join(output_dir, 'tracks'))
                 
         # Step 3 : Sample Clusters
         parser.parse_to_clusters()
 
         clusters = combine_clusters(parser.clusters, args.combine_clusters)
 
-        metric = TIS.radial
-        # metric = TIS.angular
-        # metric = TIS.euclid
+        metrics = [METRICS[name] for name in dict.fromkeys(args.metric)]
 
-        data = NoteCorrelation.correlation(clusters, metric, args.window_size)
-        NoteCorrelation.draw_hitmap(data)        
+        if args.preview:
+            results, masks = NoteCorrelation.previews(clusters, metrics, args.window_size, args.preview_size)
+        else:
+            results, masks = NoteCorrelation.correlations(clusters, metrics, args.window_size)
+        if args.preview and args.preview_error:
+            for metric in metrics:
+                error = NoteCorrelation.preview_error(clusters, metric, args.window_size, args.preview_size)
+                logger.info(f'Preview error of {metric}: {error}')
+                eprint(f'Preview error of {metric}: {error}')
+        if store is not None:
+            store_results(store, midipath, parser, clusters, results, masks)
+        for name, data in results.items():
+            NoteCorrelation.draw_hitmap(data, name)
         return ReturnValues.SUCCESS
+
+def store_results(store:ResultStore, midipath:str, parser:MidiParser, 
+                  clusters:list[NoteCluster], results:NoteCorrelation.Correlations,
+                  masks:NoteCorrelation.CellMasks) -> None:
+    metadata = {
+        'midi_type': parser.midi.type,
+        'ticks_per_beat': parser.ticks_per_beat,
+        'tracks': len(parser.midi.tracks),
+        'beats': parser.longest_track // parser.ticks_per_beat,
+    }
+    scalars = {}
+    for name, data in results.items():
+        for stat, value in NoteCorrelation.summarize(data, masks[name]).items():
+            scalars[f'{name}.{stat}'] = value
+    arrays = {'cluster_times': np.array([(cluster.begin_time, cluster.end_time) for cluster in clusters])}
+    store.append(os.path.abspath(midipath), ReturnValues.SUCCESS.name, metadata, scalars, arrays)
                             
 if __name__ == '__main__':
     parser = argsparser()
@@ -1,3 +1,4 @@
+import struct
 from typing import Iterable
 import mido
 import tis.NoteCluster as NC
@@ -13,7 +14,8 @@ class MidiParser():
             while len(self.midi.tracks) > 1:
                 self.midi.tracks.pop(1)
         self.ticks_per_beat:int = self.midi.ticks_per_beat
-        self.longest_track = max(map(self._get_track_duration, self.midi.tracks))
+        self.track_durations:list[int] = list(map(self._get_track_duration, self.midi.tracks))
+        self.longest_track = max(self.track_durations)
     
     def _next_beat_time(self, time:int) -> int:
         return self._beat_start_time(time) + self.ticks_per_beat
@@ -31,9 +33,10 @@ class MidiParser():
     def pad_tracks(self) -> None:
         if(self.midi.type == 0):
             return
-        for track in self.midi.tracks:
+        for i, track in enumerate(self.midi.tracks):
             end_of_track_msg = track[-1]            
-            end_of_track_msg.time += self.longest_track - self._get_track_duration(track)
+            end_of_track_msg.time += self.longest_track - self.track_durations[i]
+            self.track_durations[i] = self.longest_track
 
     def commit_cluster(self, from_time:int, to_time:int, playing_notes:list[tuple[NC.Note,int]]) -> int:
         while self._beat_start_time(to_time) > self._beat_start_time(from_time):
@@ -119,6 +122,29 @@ class MidiParser():
         while len(self.clusters) > 1 and self.clusters[-2] == self.clusters[-1]:
             self.clusters[-2] += self.clusters[-1]
             self.clusters.pop(-1)
-                    
 
 
+def read_track_chunks(filepath:str) -> tuple[bytes, list[bytes]]:
+    # Splits a standard MIDI file into its raw header and MTrk chunks without decoding any event
+    with open(filepath, 'rb') as file:
+        data = file.read()
+    if data[:4] != b'MThd':
+        raise Exception(f'Not a standard MIDI file: {filepath}')
+    header_len, = struct.unpack('>I', data[4:8])
+    header = data[8:8 + header_len]
+    chunks = []
+    pos = 8 + header_len
+    while pos + 8 <= len(data):
+        chunk_len, = struct.unpack('>I', data[pos + 4:pos + 8])
+        if data[pos:pos + 4] == b'MTrk':
+            chunks.append(data[pos:pos + 8 + chunk_len])
+        pos += 8 + chunk_len
+    return header, chunks
+
+def write_track_chunks(filepath:str, header:bytes, chunks:list[bytes]) -> None:
+    # Header keeps the original format and division, only the number of tracks changes
+    new_header = header[:2] + struct.pack('>H', len(chunks)) + header[4:]
+    with open(filepath, 'wb') as file:
+        file.write(b'MThd' + struct.pack('>I', len(new_header)) + new_header)
+        for chunk in chunks:
+            file.write(chunk)
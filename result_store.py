@@ -0,0 +1,153 @@
+import io
+import json
+import os
+import sqlite3
+import time
+from typing import Any, Self
+
+import numpy as np
+
+_SCHEMA = '''
+CREATE TABLE IF NOT EXISTS runs (
+    id INTEGER PRIMARY KEY,
+    started REAL NOT NULL,
+    args TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS files (
+    id INTEGER PRIMARY KEY,
+    run_id INTEGER NOT NULL REFERENCES runs(id),
+    path TEXT NOT NULL,
+    status TEXT NOT NULL,
+    midi_type INTEGER,
+    ticks_per_beat INTEGER,
+    tracks INTEGER,
+    beats INTEGER
+);
+CREATE TABLE IF NOT EXISTS scalars (
+    file_id INTEGER NOT NULL REFERENCES files(id),
+    name TEXT NOT NULL,
+    value REAL NOT NULL,
+    PRIMARY KEY (file_id, name)
+);
+CREATE TABLE IF NOT EXISTS arrays (
+    file_id INTEGER NOT NULL REFERENCES files(id),
+    name TEXT NOT NULL,
+    data BLOB NOT NULL,
+    PRIMARY KEY (file_id, name)
+);
+CREATE INDEX IF NOT EXISTS files_path ON files(path);
+CREATE INDEX IF NOT EXISTS scalars_name_value ON scalars(name, value);
+'''
+
+_OPERATORS = ('<', '<=', '=', '>=', '>', '!=')
+
+class FileRecord():
+    def __init__(self, id:int, run_id:int, path:str, status:str, midi_type:int | None,
+                 ticks_per_beat:int | None, tracks:int | None, beats:int | None) -> None:
+        self.id = id
+        self.run_id = run_id
+        self.path = path
+        self.status = status
+        self.midi_type = midi_type
+        self.ticks_per_beat = ticks_per_beat
+        self.tracks = tracks
+        self.beats = beats
+
+    def __str__(self) -> str:
+        return f'{self.path} (run {self.run_id}): {self.status}'
+
+    def __repr__(self) -> str:
+        return str(self)
+
+class ResultStore():
+    # Append-only SQLite store shared by all the files of all the runs.
+    # Every process opens its own ResultStore on the same path; WAL mode lets
+    # parallel workers append while others read.
+    def __init__(self, path:str, run_id:int | None = None) -> None:
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self.path = path
+        self.run_id = run_id
+        self.connection = sqlite3.connect(path, timeout=60)
+        self.connection.execute('PRAGMA journal_mode=WAL')
+        self.connection.execute('PRAGMA foreign_keys=ON')
+        with self.connection:
+            self.connection.executescript(_SCHEMA)
+
+    def close(self) -> None:
+        self.connection.close()
+
+    def __enter__(self) -> Self:
+        return self
+
+    def __exit__(self, *_:Any) -> None:
+        self.close()
+
+    def start_run(self, args:dict[str, Any]) -> int:
+        with self.connection:
+            cursor = self.connection.execute('INSERT INTO runs (started, args) VALUES (?, ?)',
+                                             (time.time(), json.dumps(args, default=str)))
+        assert cursor.lastrowid is not None
+        self.run_id = cursor.lastrowid
+        return self.run_id
+
+    def append(self, path:str, status:str, metadata:dict[str, int] | None = None,
+               scalars:dict[str, float] | None = None, arrays:dict[str, np.ndarray[Any, Any]] | None = None) -> int:
+        if self.run_id is None:
+            raise Exception('No run was started for this result store')
+        metadata = metadata or {}
+        scalars = scalars or {}
+        arrays = arrays or {}
+        with self.connection:
+            cursor = self.connection.execute(
+                'INSERT INTO files (run_id, path, status, midi_type, ticks_per_beat, tracks, beats) VALUES (?, ?, ?, ?, ?, ?, ?)',
+                (self.run_id, path, status, metadata.get('midi_type'), metadata.get('ticks_per_beat'),
+                 metadata.get('tracks'), metadata.get('beats')))
+            file_id = cursor.lastrowid
+            self.connection.executemany('INSERT INTO scalars (file_id, name, value) VALUES (?, ?, ?)',
+                                        [(file_id, name, float(value)) for name, value in scalars.items()])
+            self.connection.executemany('INSERT INTO arrays (file_id, name, data) VALUES (?, ?, ?)',
+                                        [(file_id, name, _pack(array)) for name, array in arrays.items()])
+        assert file_id is not None
+        return file_id
+
+    def files(self, *conditions:tuple[str, str, float], run_id:int | None = None, latest:bool = True) -> list[FileRecord]:
+        # Each condition is (scalar name, operator, value), e.g. ('radial.mean', '>', 0.6)
+        query = 'SELECT f.id, f.run_id, f.path, f.status, f.midi_type, f.ticks_per_beat, f.tracks, f.beats FROM files f'
+        clauses:list[str] = []
+        params:list[Any] = []
+        for i, (name, operator, value) in enumerate(conditions):
+            if operator not in _OPERATORS:
+                raise Exception(f'Unsupported operator: {operator}')
+            query += f' JOIN scalars s{i} ON s{i}.file_id = f.id AND s{i}.name = ?'
+            params.append(name)
+            clauses.append(f's{i}.value {operator} ?')
+            params.append(value)
+        if run_id is not None:
+            clauses.append('f.run_id = ?')
+            params.append(run_id)
+        elif latest:
+            clauses.append('f.id = (SELECT MAX(id) FROM files WHERE path = f.path)')
+        if clauses:
+            query += ' WHERE ' + ' AND '.join(clauses)
+        query += ' ORDER BY f.path'
+        return [FileRecord(*row) for row in self.connection.execute(query, params)]
+
+    def scalars(self, file_id:int) -> dict[str, float]:
+        rows = self.connection.execute('SELECT name, value FROM scalars WHERE file_id = ?', (file_id,))
+        return dict(rows.fetchall())
+
+    def array(self, file_id:int, name:str) -> np.ndarray[Any, Any]:
+        row = self.connection.execute('SELECT data FROM arrays WHERE file_id = ? AND name = ?', (file_id, name)).fetchone()
+        if row is None:
+            raise KeyError(f'No array {name} for file {file_id}')
+        return _unpack(row[0])
+
+def _pack(array:np.ndarray[Any, Any]) -> bytes:
+    buffer = io.BytesIO()
+    np.save(buffer, np.asarray(array), allow_pickle=False)
+    return buffer.getvalue()
+
+def _unpack(data:bytes) -> np.ndarray[Any, Any]:
+    return np.load(io.BytesIO(data), allow_pickle=False)
@@ -0,0 +1,83 @@
+from functools import cached_property
+from typing import Any, Callable
+
+import numpy as np
+from tis.NoteCluster import Note, NoteCluster, all_notes
+from tis.TIS import TIS, FFTChroma, Float, FloatArray, normal_fft
+
+class TISBatch():
+    # TIS vectors of a sequence of clusters, shared by all the metric kernels.
+    # counts holds the (n, 12) note durations of every cluster.
+    def __init__(self, counts:np.ndarray[Any, Any]) -> None:
+        self.sizes = np.sum(counts, axis=-1)
+        self.vectors:FFTChroma = normal_fft(counts)
+
+    def __len__(self) -> int:
+        return len(self.vectors)
+
+    @cached_property
+    def norms(self) -> FloatArray:
+        return np.linalg.norm(self.vectors, axis=-1)
+
+    @cached_property
+    def gram(self) -> FloatArray:
+        # Real part of the hermitian inner product, same as TISPoint.__mul__
+        return np.real(self.vectors @ np.conjugate(self.vectors).T)
+
+    def empty(self) -> np.ndarray[Any, np.dtype[np.bool_]]:
+        return self.sizes == 0
+
+def cluster_counts(clusters:list[NoteCluster]) -> np.ndarray[Any, Any]:
+    counts = [[cluster.notes[note] for note in all_notes()] for cluster in clusters]
+    return np.array(counts, dtype=float).reshape(len(clusters), Note.NOTE_LEN)
+
+ZERO_NORM = 1e-9
+
+PairwiseMetric = Callable[[NoteCluster, NoteCluster], Float]
+BatchKernel = Callable[[TISBatch], FloatArray]
+BatchDefined = Callable[[TISBatch], np.ndarray[Any, np.dtype[np.bool_]]]
+
+def _non_empty(batch:TISBatch) -> np.ndarray[Any, np.dtype[np.bool_]]:
+    return ~batch.empty()
+
+class Metric():
+    # defined tells which windows the metric can be computed on,
+    # cells of the other windows are left out of the correlation
+    def __init__(self, name:str, pairwise:PairwiseMetric, kernel:BatchKernel, defined:BatchDefined = _non_empty) -> None:
+        self.name = name
+        self.pairwise = pairwise
+        self.kernel = kernel
+        self.defined = defined
+
+    def __call__(self, c1:NoteCluster, c2:NoteCluster) -> Float:
+        return self.pairwise(c1, c2)
+
+    def __str__(self) -> str:
+        return self.name
+
+    def __repr__(self) -> str:
+        return self.name
+
+def _euclid_kernel(batch:TISBatch) -> FloatArray:
+    squared = batch.norms ** 2
+    distances = squared[:, None] + squared[None, :] - 2 * batch.gram
+    return np.sqrt(np.maximum(distances, 0))
+
+def _angular_defined(batch:TISBatch) -> np.ndarray[Any, np.dtype[np.bool_]]:
+    # The angle to a zero TIS vector (e.g. a uniform chroma) is undefined,
+    # TIS.angular asserts on it while the kernel leaves the cells out
+    return _non_empty(batch) & (batch.norms > ZERO_NORM)
+
+def _angular_kernel(batch:TISBatch) -> FloatArray:
+    denominator = np.outer(batch.norms, batch.norms)
+    cos = np.divide(batch.gram, denominator, out=np.zeros_like(batch.gram), where=denominator > 0)
+    return np.arccos(np.clip(cos, -1, 1)) / np.pi
+
+def _radial_kernel(batch:TISBatch) -> FloatArray:
+    return np.abs(np.subtract.outer(batch.norms, batch.norms))
+
+METRICS:dict[str, Metric] = dict([(metric.name, metric) for metric in [
+    Metric('radial', TIS.radial, _radial_kernel),
+    Metric('angular', TIS.angular, _angular_kernel, _angular_defined),
+    Metric('euclid', TIS.euclid, _euclid_kernel),
+]])
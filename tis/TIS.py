@@ -5,14 +5,20 @@ from tis.NoteCluster import ChromaVector, Note, NoteCluster
 
 FFTChroma = np.ndarray[Any, np.dtype[np.complexfloating[Any, Any]]]
 Float = np.floating[Any]
+FloatArray = np.ndarray[Any, np.dtype[Float]]
+
+TIS_WEIGHTS = [2, 11, 17, 16, 19, 7]
+
+def normal_fft(chromas: np.ndarray[Any, Any]) -> FFTChroma:
+    # Works on a single chroma vector or on a (n, 12) stack of them
+    mod_c = np.maximum(np.sum(chromas, axis=-1, keepdims=True), 1)
+    T = np.fft.fft(chromas, axis=-1)[..., 1:7]
+    return (T * TIS_WEIGHTS) / mod_c
 
 class TISPoint():
     @staticmethod
     def _normal_fft(chroma: ChromaVector) -> FFTChroma:
-        W = [2, 11, 17, 16, 19, 7]
-        mod_c = max(sum(chroma), 1)
-        T = np.fft.fft(chroma)[1:7]
-        return (T * W) / mod_c
+        return normal_fft(np.asarray(chroma, dtype=float))
 
     @classmethod
     def from_cluster(cls, note_cluster:NoteCluster) -> Self: